@@ -0,0 +1,305 @@
+# app/agent/embeddings.py
+
+"""
+Embedding backends for memory and RAG.
+--------------------------------------
+- torch: SentenceTransformer("all-MiniLM-L6-v2") (default)
+- onnx:  the same model exported to ONNX Runtime for CPU-only nodes,
+         optionally int8 dynamically quantized
+
+Select with LIRA_EMBEDDING_BACKEND=torch|onnx and
+LIRA_EMBEDDING_QUANTIZE=1. Both backends expose encode(texts) -> ndarray
+of L2-normalized vectors, so callers don't care which one they get.
+
+The onnx backend needs the extra packages in requirements-onnx.txt.
+
+Run `python -m app.agent.embeddings` to check cosine parity against the
+torch backend and benchmark encode throughput and memory; it exits
+non-zero if parity fails.
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import threading
+
+import numpy as np
+
+
+EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+EMBEDDING_DIM = 384
+EMBEDDING_BACKEND = os.getenv("LIRA_EMBEDDING_BACKEND", "torch")
+EMBEDDING_QUANTIZE = os.getenv("LIRA_EMBEDDING_QUANTIZE", "0") == "1"
+ONNX_CACHE_DIR = os.getenv("LIRA_ONNX_CACHE_DIR", os.path.join(".lira", "onnx"))
+
+# all-MiniLM-L6-v2 is trained with 256-token inputs
+MAX_SEQ_LENGTH = 256
+
+
+# ---------------------------------------------------
+# ONNX Runtime backend
+# ---------------------------------------------------
+def _onnx_dir(model_name: str) -> str:
+    return os.path.join(ONNX_CACHE_DIR, model_name.replace("/", "__"))
+
+
+def export_onnx(model_name: str = EMBEDDING_MODEL, quantize: bool = False) -> str:
+    """
+    Export the model to ONNX (once) and return the path of the .onnx file.
+    With quantize=True an int8 dynamically quantized copy is produced too.
+    """
+    out_dir = _onnx_dir(model_name)
+    fp32_path = os.path.join(out_dir, "model.onnx")
+    int8_path = os.path.join(out_dir, "model_int8.onnx")
+
+    # Outputs are written to a temp location and renamed into place, so
+    # concurrent exporters (e.g. several uvicorn workers) never expose a
+    # half-written model; the loser of the race just discards its copy.
+    if not os.path.exists(fp32_path):
+        from optimum.onnxruntime import ORTModelForFeatureExtraction
+        from transformers import AutoTokenizer
+
+        print(f"[embeddings] Exporting {model_name} to ONNX at {out_dir}...")
+        parent = os.path.dirname(out_dir)
+        os.makedirs(parent, exist_ok=True)
+        tmp_dir = tempfile.mkdtemp(prefix=".export-", dir=parent)
+        try:
+            model = ORTModelForFeatureExtraction.from_pretrained(model_name, export=True)
+            model.save_pretrained(tmp_dir)
+            AutoTokenizer.from_pretrained(model_name).save_pretrained(tmp_dir)
+            os.replace(tmp_dir, out_dir)
+        except OSError:
+            if not os.path.exists(fp32_path):
+                raise
+            # Another process finished first
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    if not quantize:
+        return fp32_path
+
+    if not os.path.exists(int8_path):
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        print("[embeddings] Quantizing ONNX model to int8...")
+        fd, tmp_path = tempfile.mkstemp(prefix=".model_int8-", suffix=".onnx", dir=out_dir)
+        os.close(fd)
+        try:
+            quantize_dynamic(fp32_path, tmp_path, weight_type=QuantType.QInt8)
+            os.replace(tmp_path, int8_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    return int8_path
+
+
+class OnnxEmbedder:
+    """
+    SentenceTransformer-compatible encoder on ONNX Runtime:
+    transformer -> mean pooling over the attention mask -> L2 normalize.
+    """
+
+    def __init__(self, model_name: str = EMBEDDING_MODEL, quantize: bool = False):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        model_path = export_onnx(model_name, quantize=quantize)
+        self.model_path = model_path
+        self.tokenizer = AutoTokenizer.from_pretrained(os.path.dirname(model_path))
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(
+            model_path, options, providers=["CPUExecutionProvider"]
+        )
+        self._input_names = {i.name for i in self.session.get_inputs()}
+
+    def encode(self, sentences, batch_size: int = 32, **kwargs) -> np.ndarray:
+        if isinstance(sentences, str):
+            sentences = [sentences]
+
+        batches = []
+        for start in range(0, len(sentences), batch_size):
+            batch = sentences[start:start + batch_size]
+            inputs = self.tokenizer(
+                batch,
+                padding=True,
+                truncation=True,
+                max_length=MAX_SEQ_LENGTH,
+                return_tensors="np",
+            )
+            feed = {k: v.astype(np.int64) for k, v in inputs.items() if k in self._input_names}
+            token_embeddings = self.session.run(None, feed)[0]
+
+            mask = inputs["attention_mask"][..., None].astype(np.float32)
+            pooled = (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            norms = np.linalg.norm(pooled, axis=1, keepdims=True)
+            batches.append(pooled / np.clip(norms, 1e-12, None))
+
+        if not batches:
+            return np.zeros((0, EMBEDDING_DIM), dtype=np.float32)
+        return np.concatenate(batches).astype(np.float32)
+
+
+# ---------------------------------------------------
+# Backend selection
+# ---------------------------------------------------
+def get_embedder(backend: str | None = None, quantize: bool | None = None):
+    """
+    Return a shared embedder for the configured backend.
+    Cached so the model loads once per process, not once per call.
+    """
+    backend = backend or EMBEDDING_BACKEND
+    quantize = EMBEDDING_QUANTIZE if quantize is None else quantize
+    key = (backend, quantize and backend == "onnx")
+
+    embedder = _embedders.get(key)
+    if embedder is None:
+        # Hold the lock while loading so concurrent first requests load
+        # (and possibly export) the model once, not once each
+        with _embedders_lock:
+            embedder = _embedders.get(key)
+            if embedder is None:
+                embedder = _embedders[key] = _load_embedder(*key)
+    return embedder
+
+
+_embedders: dict[tuple[str, bool], object] = {}
+_embedders_lock = threading.Lock()
+
+
+def _load_embedder(backend: str, quantize: bool):
+    if backend == "onnx":
+        return OnnxEmbedder(EMBEDDING_MODEL, quantize=quantize)
+    if backend == "torch":
+        from sentence_transformers import SentenceTransformer
+        return SentenceTransformer(EMBEDDING_MODEL, device="cpu")
+    raise ValueError(f"Unknown embedding backend: {backend!r} (expected 'torch' or 'onnx')")
+
+
+# ---------------------------------------------------
+# Parity + benchmark
+# ---------------------------------------------------
+SAMPLE_TEXTS = [
+    "Quantum computers use qubits that can be in superposition.",
+    "LangGraph builds stateful agent workflows as graphs of nodes.",
+    "ChromaDB stores embeddings and supports similarity search.",
+    "The mitochondria is the powerhouse of the cell.",
+    "Interest rates affect mortgage payments and housing demand.",
+    "Rust's borrow checker prevents data races at compile time.",
+    "A short query",
+    "A much longer passage about retrieval-augmented generation, which combines "
+    "a retriever over a vector index with a language model that conditions on "
+    "the retrieved context to produce grounded answers. " * 4,
+]
+
+
+def _rss_mb() -> float:
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / 2**20
+    except ImportError:
+        import resource
+        # ru_maxrss is KiB on Linux (peak, not current)
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def check_parity(backend: str = "onnx", quantize: bool = False, min_cosine: float = 0.99) -> float:
+    """
+    Compare `backend` against torch text-by-text and return the worst
+    cosine similarity. Raises AssertionError below `min_cosine`.
+    """
+    reference = get_embedder("torch").encode(SAMPLE_TEXTS)
+    candidate = get_embedder(backend, quantize).encode(SAMPLE_TEXTS)
+
+    reference = reference / np.linalg.norm(reference, axis=1, keepdims=True)
+    candidate = candidate / np.linalg.norm(candidate, axis=1, keepdims=True)
+    worst = float((reference * candidate).sum(axis=1).min())
+
+    if worst < min_cosine:
+        raise AssertionError(
+            f"{backend} (quantize={quantize}) parity {worst:.4f} < {min_cosine}"
+        )
+    return worst
+
+
+def benchmark(backend: str, quantize: bool = False, n: int = 512, batch_size: int = 32) -> dict:
+    """
+    Measure load-time RSS growth and encode throughput (sentences/sec).
+    RSS is only meaningful in a process that hasn't loaded another model
+    yet; use benchmark_isolated() to get that.
+    """
+    import time
+
+    rss_before = _rss_mb()
+    start = time.perf_counter()
+    embedder = get_embedder(backend, quantize)
+    load_s = time.perf_counter() - start
+    rss_after = _rss_mb()
+
+    texts = [SAMPLE_TEXTS[i % len(SAMPLE_TEXTS)] for i in range(n)]
+    embedder.encode(texts[:batch_size], batch_size=batch_size)  # warm-up
+
+    start = time.perf_counter()
+    embedder.encode(texts, batch_size=batch_size)
+    elapsed = time.perf_counter() - start
+
+    model_mb = None
+    if isinstance(embedder, OnnxEmbedder):
+        model_mb = os.path.getsize(embedder.model_path) / 2**20
+
+    return {
+        "backend": backend + ("-int8" if quantize else ""),
+        "load_s": round(load_s, 2),
+        "rss_delta_mb": round(rss_after - rss_before, 1),
+        "model_file_mb": round(model_mb, 1) if model_mb else None,
+        "sentences_per_s": round(n / elapsed, 1),
+    }
+
+
+def benchmark_isolated(backend: str, quantize: bool = False) -> dict:
+    """Run benchmark() in a fresh interpreter so no other model skews RSS."""
+    import json
+    import subprocess
+
+    out = subprocess.run(
+        [sys.executable, "-m", "app.agent.embeddings", "--benchmark", backend, str(int(quantize))],
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    # The export / quantize steps may print progress first
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def demo() -> int:
+    """Run parity checks and benchmarks; returns 1 if any parity check failed."""
+    failed = False
+
+    print("\n=== EMBEDDING BACKENDS: parity vs torch ===")
+    # int8 quantization trades a little accuracy for speed and size
+    for quantize, min_cosine in ((False, 0.99), (True, 0.97)):
+        label = "onnx-int8" if quantize else "onnx"
+        try:
+            print(f"{label:10s} worst cosine = {check_parity('onnx', quantize, min_cosine):.4f}")
+        except AssertionError as e:
+            print(f"{label:10s} FAILED: {e}")
+            failed = True
+
+    # Each backend is benchmarked in its own process: the models loaded
+    # above are never returned to the OS, so RSS here would measure nothing
+    print("\n=== EMBEDDING BACKENDS: benchmark ===")
+    for backend, quantize in (("torch", False), ("onnx", False), ("onnx", True)):
+        print(benchmark_isolated(backend, quantize))
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["--benchmark"]:
+        import json
+        print(json.dumps(benchmark(sys.argv[2], sys.argv[3] == "1")))
+        sys.exit(0)
+    sys.exit(demo())
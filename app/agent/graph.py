@@ -10,18 +10,101 @@ This will:
 - Prepare for adding tools, RAG, LLM steps
 """
 
+import json
+import os
+import re
+import threading
+
 from langgraph.graph import StateGraph, END
 from pydantic import BaseModel
 
 from langchain_ollama import ChatOllama
 from langchain_core.prompts import ChatPromptTemplate
 
-from app.agent.prompts import PLAN_PROMPT, SUMMARIZE_PROMPT
-from app.agent.tools import web_search
-from app.agent.memory import store_summary, rag_retrieve
+from app.agent.prompts import (
+    PLAN_PROMPT,
+    SUMMARIZE_PROMPT,
+    MAP_SUMMARIZE_PROMPT,
+    REDUCE_SUMMARIZE_PROMPT,
+)
+from app.agent.tools import web_search_many
+from app.agent.memory import (
+    memory_tiers,
+    partition_collection,
+    rag_retrieve,
+    rag_retrieve_scored,
+    store_summary,
+)
 from app.agent.safety import is_query_allowed
+from app.agent.resilience import (
+    POLICIES,
+    call_external,
+    is_available,
+    map_concurrent,
+)
 
 
+# ---------------------------------------------------
+# Routing configuration
+# ---------------------------------------------------
+# Top-hit cosine similarity at which a stored summary is trusted to answer
+# the query directly (skipping web search + summarization).
+MEMORY_HIT_THRESHOLD = float(os.getenv("LIRA_MEMORY_HIT_THRESHOLD", "0.8"))
+
+# Nodes each route skips, and how many LLM calls each node makes
+# (summarize: see expected_llm_calls). Used to report how much work conditional routing avoided.
+ROUTE_SKIPPED_NODES = {
+    "full": [],
+    "memory": ["search", "summarize"],
+    # Search dependency unavailable: answer from memory only
+    "degraded": ["search", "summarize"],
+    "blocked": ["memory", "search", "summarize", "rag"],
+}
+NODE_LLM_CALLS = {"plan": 1, "summarize": 1, "rag": 1}
+
+# Map-reduce makes a variable number of summarize calls (chunks + reduces),
+# so the cost of a skipped summarize is the running average actually observed.
+_observed_llm_calls: dict[str, list[int]] = {}  # node -> [total calls, runs]
+_observed_lock = threading.Lock()
+
+
+def _record_llm_calls(node: str, calls: int):
+    with _observed_lock:
+        totals = _observed_llm_calls.setdefault(node, [0, 0])
+        totals[0] += calls
+        totals[1] += 1
+
+
+def expected_llm_calls(node: str) -> float:
+    """Average LLM calls per run of `node` so far (static count until observed)."""
+    with _observed_lock:
+        total, runs = _observed_llm_calls.get(node, (0, 0))
+    return total / runs if runs else NODE_LLM_CALLS.get(node, 0)
+
+# llm_calls_avoided counts only what memory-first routing saved. Blocked
+# runs never reached an LLM before routing existed, and degraded runs skip
+# summarize because search failed, so neither avoided any calls.
+ROUTES_WITHOUT_AVOIDED_CALLS = {"blocked", "degraded"}
+
+# Upper bound on searches per run (the user query + plan-derived sub-queries)
+SEARCH_MAX_QUERIES = int(os.getenv("LIRA_SEARCH_MAX_QUERIES", "4"))
+
+# Summarization: "map_reduce" (used once the search payload exceeds
+# SUMMARIZE_MAP_REDUCE_THRESHOLD) or "single" (always one prompt).
+SUMMARIZE_MODE = os.getenv("LIRA_SUMMARIZE_MODE", "map_reduce")
+SUMMARIZE_MAP_REDUCE_THRESHOLD = int(os.getenv("LIRA_SUMMARIZE_MAP_REDUCE_THRESHOLD", "16000"))  # characters
+SUMMARIZE_CHUNK_SIZE = int(os.getenv("LIRA_SUMMARIZE_CHUNK_SIZE", "4000"))  # characters
+# Max parallel map / reduce calls; 0 (default) runs one per chunk, so each
+# round takes about as long as its slowest chunk.
+SUMMARIZE_FANOUT = int(os.getenv("LIRA_SUMMARIZE_FANOUT", "0"))
+
+
+class NodeError(RuntimeError):
+    """
+    Raised when a node fails. Raising (instead of writing state.error)
+    stops the run before the node completes, so a checkpointed run can
+    later resume from that node rather than from plan.
+    """
 
 
 # ---------------------------------------------------
@@ -30,6 +113,10 @@ from app.agent.safety import is_query_allowed
 class AgentState(BaseModel):
     """Shared state that passes through all nodes."""
     query: str
+    # Memory partition (tenant / session); None = global memory
+    namespace: str | None = None
+    use_shared_memory: bool = False
+
     plan: str | None = None
     search_results: str | None = None
     summary: str | None = None
@@ -41,11 +128,35 @@ class AgentState(BaseModel):
     safety_note: str | None = None
     error: str | None = None
 
+    # Searches actually issued (user query + plan-derived sub-queries)
+    search_queries: list[str] = []
+    # Number of map chunks summarized (0 = single-prompt summary)
+    summary_chunks: int = 0
+
+    # Routing: which path the graph took and what it skipped
+    route: str | None = None
+    memory_context: str | None = None
+    memory_score: float | None = None
+    skipped_nodes: list[str] = []
+    llm_calls_avoided: int = 0
+
 
 
 # ---------------------------------------------------
 # Node functions (we will fill them later)
 # ---------------------------------------------------
+def get_llm():
+    """
+    Ollama chat model with a client-side timeout, so a call abandoned by
+    call_external is actually aborted and frees its worker.
+    """
+    return ChatOllama(
+        model="llama3.2",
+        temperature=0.2,
+        client_kwargs={"timeout": POLICIES["ollama"]["timeout"]},
+    )
+
+
 def plan_node(state: AgentState):
     """Use an LLM to generate a research plan, with safety guard."""
 
@@ -55,55 +166,229 @@ def plan_node(state: AgentState):
         state.blocked = True
         state.safety_note = reason
         state.plan = "Blocked by safety filter."
-        # We stop here logically; other nodes will be no-ops when blocked
+        # route_after_plan sends blocked queries straight to final
+        state.route = "blocked"
         return state
 
     # 2) Normal planning
-    llm = ChatOllama(model="llama3.2", temperature=0.2)
+    llm = get_llm()
     prompt = ChatPromptTemplate.from_template(PLAN_PROMPT)
     chain = prompt | llm
 
-    response = chain.invoke({"query": state.query})
+    response = call_external("ollama", chain.invoke, {"query": state.query})
     state.plan = response.content if hasattr(response, "content") else str(response)
     return state
 
 
 
 
+def memory_node(state: AgentState):
+    """Check stored summaries first; a strong top hit lets us skip search."""
+    if state.blocked or state.error:
+        return state
+
+    print("[memory_node] Checking vector memory before searching...")
+    try:
+        context, score = rag_retrieve_scored(
+            memory_tiers(state.namespace, state.use_shared_memory), state.query
+        )
+    except Exception as e:
+        # Memory is an optimization here; fall back to the full pipeline.
+        print(f"[memory_node] Memory lookup failed, using full pipeline: {e}")
+        context, score = "", None
+
+    state.memory_score = score
+    if context and score is not None and score >= MEMORY_HIT_THRESHOLD:
+        state.memory_context = context
+        state.route = "memory"
+    elif not is_available("tavily"):
+        # Search circuit is open: don't wait on it, answer from memory
+        state.memory_context = context or None
+        state.route = "degraded"
+    else:
+        state.route = "full"
+    return state
+
+
+
+
+# Tool / meta steps ("Use the web_search tool ...") describe how, not what
+_TOOL_STEP = re.compile(r"\b(?:web_search|summarizer|rag|tools?)\b", re.I)
+_STEP_PREFIX = re.compile(
+    r"^\s*(?:step\s*\d+\s*[:.)-]?\s*|\d+\s*[:.)-]\s*)?"
+    r"(?:(?:web\s+)?search(?:\s+the\s+web)?|look\s+up|find(?:\s+out)?|research|investigate|explore)"
+    r"(?:\s+(?:for|about|on|into))?\s*",
+    re.I,
+)
+
+
+def _plan_steps(plan: str | None) -> list[str]:
+    """Pull the "steps" list out of the planner's JSON (tolerating code fences)."""
+    if not plan:
+        return []
+    start, end = plan.find("{"), plan.rfind("}")
+    if start == -1 or end <= start:
+        return []
+    try:
+        data = json.loads(plan[start:end + 1])
+    except ValueError:
+        return []
+
+    steps = data.get("steps") if isinstance(data, dict) else None
+    if not isinstance(steps, list):
+        return []
+
+    texts = []
+    for step in steps:
+        if isinstance(step, dict):
+            step = " ".join(str(v) for v in step.values() if isinstance(v, str))
+        if isinstance(step, str) and step.strip():
+            texts.append(step.strip())
+    return texts
+
+
+def plan_sub_queries(query: str, plan: str | None, limit: int = SEARCH_MAX_QUERIES) -> list[str]:
+    """
+    Derive search queries from plan steps that start with a search verb.
+    The user query always comes first; steps that don't mention any of
+    the query's keywords are anchored to it so they search the right topic.
+    """
+    queries = [query]
+    seen = {query.lower()}
+    keywords = {w for w in re.findall(r"\w+", query.lower()) if len(w) > 3}
+
+    for step in _plan_steps(plan):
+        if len(queries) >= limit:
+            break
+        prefix = _STEP_PREFIX.match(step)
+        if not prefix or _TOOL_STEP.search(step):
+            continue
+        focus = step[prefix.end():].strip(" .")
+        if not focus:
+            continue
+        if not keywords & set(re.findall(r"\w+", focus.lower())):
+            focus = f"{query.rstrip(' ?.')} {focus}"
+        if focus.lower() not in seen:
+            seen.add(focus.lower())
+            queries.append(focus)
+
+    return queries
+
+
 def search_node(state: AgentState):
     if state.blocked or state.error:
         return state
 
-    print("[search_node] Searching the web...")
+    state.search_queries = plan_sub_queries(state.query, state.plan)
+    print(f"[search_node] Searching the web ({len(state.search_queries)} queries)...")
     try:
-        results = web_search(state.query)
+        results = web_search_many(state.search_queries)
         state.search_results = results
     except Exception as e:
-        state.error = f"[search_node] {e}"
+        # Timed out, circuit open or erroring: degrade to a memory-only answer
+        print(f"[search_node] Search unavailable, degrading to memory: {e}")
+        state.route = "degraded"
     return state
 
 
 
 
+def chunk_content(content: str, chunk_size: int = SUMMARIZE_CHUNK_SIZE) -> list[str]:
+    """
+    Pack search results into chunks of at most chunk_size characters,
+    splitting on blank lines so individual results stay intact where possible.
+    """
+    chunks, current = [], ""
+    for block in content.split("\n\n"):
+        while len(block) > chunk_size:
+            # A single oversized block: hard-split it
+            if current:
+                chunks.append(current)
+                current = ""
+            chunks.append(block[:chunk_size])
+            block = block[chunk_size:]
+        if current and len(current) + 2 + len(block) > chunk_size:
+            chunks.append(current)
+            current = ""
+        current = f"{current}\n\n{block}" if current else block
+    if current.strip():
+        chunks.append(current)
+    return chunks
+
+
+def _llm_text(chain, inputs: dict) -> str:
+    response = call_external("ollama", chain.invoke, inputs)
+    return response.content if hasattr(response, "content") else str(response)
+
+
+def _join_partials(partials: list[str]) -> str:
+    return "\n\n".join(f"Part {i}:\n{p}" for i, p in enumerate(partials, 1))
+
+
+def _summarize_map_reduce(llm, chunks: list[str]) -> tuple[str, int]:
+    """
+    Summarize chunks in parallel (map), then merge the partials (reduce).
+    While the partials don't fit in one chunk they are reduced in parallel
+    groups first, so no single prompt grows with the input size.
+    Returns the summary and the number of LLM calls made.
+    """
+    map_chain = ChatPromptTemplate.from_template(MAP_SUMMARIZE_PROMPT) | llm
+    reduce_chain = ChatPromptTemplate.from_template(REDUCE_SUMMARIZE_PROMPT) | llm
+
+    def reduce(text: str) -> str:
+        return _llm_text(reduce_chain, {"summaries": text})
+
+    partials = map_concurrent(
+        lambda chunk: _llm_text(map_chain, {"content": chunk}),
+        chunks,
+        SUMMARIZE_FANOUT or len(chunks),
+    )
+    calls = len(chunks)
+
+    groups = chunk_content(_join_partials(partials))
+    # Stop if a round doesn't shrink the number of partials (it never would)
+    while 1 < len(groups) < len(partials):
+        partials = map_concurrent(reduce, groups, SUMMARIZE_FANOUT or len(groups))
+        calls += len(groups)
+        groups = chunk_content(_join_partials(partials))
+
+    return reduce(_join_partials(partials)), calls + 1
+
+
 def summarize_node(state: AgentState):
     if state.blocked or state.error:
         return state
 
-    print("[summarize_node] Summarizing search results...")
+    content = state.search_results or ""
+    use_map_reduce = (
+        SUMMARIZE_MODE == "map_reduce"
+        and len(content) > SUMMARIZE_MAP_REDUCE_THRESHOLD
+    )
 
-    llm = ChatOllama(model="llama3.2", temperature=0.2)
-    prompt = ChatPromptTemplate.from_template(SUMMARIZE_PROMPT)
-    chain = prompt | llm
+    llm = get_llm()
 
     try:
-        response = chain.invoke({"content": state.search_results})
-        summary_text = response.content if hasattr(response, "content") else str(response)
+        if use_map_reduce:
+            chunks = chunk_content(content)
+            print(f"[summarize_node] Map-reduce summarizing {len(chunks)} chunks...")
+            summary_text, calls = _summarize_map_reduce(llm, chunks)
+            state.summary_chunks = len(chunks)
+        else:
+            print("[summarize_node] Summarizing search results...")
+            chain = ChatPromptTemplate.from_template(SUMMARIZE_PROMPT) | llm
+            summary_text = _llm_text(chain, {"content": content})
+            calls = 1
+        _record_llm_calls("summarize", calls)
         state.summary = summary_text
+    except Exception as e:
+        raise NodeError(f"[summarize_node] {e}") from e
 
-        print("[summarize_node] Storing summary into vector memory...")
-        store_summary("agent_memory", summary_text)
+    print("[summarize_node] Storing summary into vector memory...")
+    try:
+        store_summary(partition_collection(state.namespace), summary_text)
     except Exception as e:
-        state.error = f"[summarize_node] {e}"
+        # Memory is a cache; losing one write shouldn't cost the finished summary
+        print(f"[summarize_node] Memory write failed, skipping: {e}")
 
     return state
 
@@ -115,19 +400,25 @@ def rag_node(state: AgentState):
     if state.blocked or state.error:
         return state
 
-    print("[rag_node] Retrieving memory from vector DB...")
-
-    try:
-        context = rag_retrieve("agent_memory", state.query)
-    except Exception as e:
-        state.error = f"[rag_node] {e}"
-        return state
+    if state.memory_context:
+        # Memory-first route: reuse what memory_node already retrieved
+        context = state.memory_context
+    else:
+        print("[rag_node] Retrieving memory from vector DB...")
+        try:
+            context = rag_retrieve(
+                memory_tiers(state.namespace, state.use_shared_memory), state.query
+            )
+        except Exception as e:
+            # Memory unavailable: answer from this run's summary, if any
+            print(f"[rag_node] Memory retrieval failed, using the summary: {e}")
+            context = state.summary or ""
 
     if not context:
         state.rag_answer = "I don't know based on the knowledge I stored so far."
         return state
 
-    llm = ChatOllama(model="llama3.2", temperature=0.2)
+    llm = get_llm()
     prompt = ChatPromptTemplate.from_messages([
         (
             "system",
@@ -139,13 +430,13 @@ def rag_node(state: AgentState):
     chain = prompt | llm
 
     try:
-        response = chain.invoke({
+        response = call_external("ollama", chain.invoke, {
             "context": context,
             "question": state.query
         })
         state.rag_answer = response.content if hasattr(response, "content") else str(response)
     except Exception as e:
-        state.error = f"[rag_node LLM] {e}"
+        raise NodeError(f"[rag_node LLM] {e}") from e
 
     return state
 
@@ -155,6 +446,11 @@ def rag_node(state: AgentState):
 def final_node(state: AgentState):
     print("[final_node] Composing final answer...")
 
+    # Record what conditional routing skipped
+    state.skipped_nodes = list(ROUTE_SKIPPED_NODES.get(state.route, []))
+    if state.route not in ROUTES_WITHOUT_AVOIDED_CALLS:
+        state.llm_calls_avoided = round(sum(expected_llm_calls(n) for n in state.skipped_nodes))
+
     # 1) Safety block
     if state.blocked:
         state.final_answer = f"""
@@ -181,6 +477,19 @@ You can try again later, or simplify the query.
         return state
 
     # 3) Normal happy path
+    if state.route == "memory":
+        research = (
+            "Answered from stored memory "
+            f"(top-hit similarity {state.memory_score:.2f}); web search skipped."
+        )
+        grounding = "- Summaries previously stored in ChromaDB"
+    elif state.route == "degraded":
+        research = "Web search is currently unavailable; answered from stored memory only."
+        grounding = "- Summaries previously stored in ChromaDB"
+    else:
+        research = state.summary
+        grounding = "- Real web search results\n- Summaries generated by the agent"
+
     final_output = f"""
 =========== FINAL ANSWER ===========
 🎯 User Query
@@ -190,15 +499,14 @@ You can try again later, or simplify the query.
 {state.plan}
 
 🔍 Summary of Research
-{state.summary}
+{research}
 
 📚 Memory-Aware RAG Answer
 {state.rag_answer}
 
 ------------------------------------
 This response is grounded in:
-- Real web search results
-- Summaries generated by the agent
+{grounding}
 - Memory stored in ChromaDB
 - Context-retrieved reasoning
 ====================================
@@ -209,14 +517,37 @@ This response is grounded in:
 
 
 
+# ---------------------------------------------------
+# Routing
+# ---------------------------------------------------
+def route_after_plan(state: AgentState) -> str:
+    """Blocked queries skip straight to the final answer."""
+    return "final" if state.blocked else "memory"
+
+
+def route_after_memory(state: AgentState) -> str:
+    """Strong memory hits answer from RAG without searching."""
+    return "rag" if state.route in ("memory", "degraded") else "search"
+
+
+def route_after_search(state: AgentState) -> str:
+    """A degraded search has nothing to summarize."""
+    return "rag" if state.route == "degraded" else "summarize"
+
+
 # ---------------------------------------------------
 # Build the Agent Graph
 # ---------------------------------------------------
-def build_graph():
+def build_graph(checkpointer=None):
+    """
+    Compile the agent graph. Pass a LangGraph checkpointer to persist
+    state after every node, keyed by the run's thread_id.
+    """
     graph = StateGraph(AgentState)
 
     # Define execution nodes
     graph.add_node("plan", plan_node)
+    graph.add_node("memory", memory_node)
     graph.add_node("search", search_node)
     graph.add_node("summarize", summarize_node)
     graph.add_node("rag", rag_node)
@@ -224,13 +555,20 @@ def build_graph():
 
     # Node connections
     graph.set_entry_point("plan")
-    graph.add_edge("plan", "search")
-    graph.add_edge("search", "summarize")
+    graph.add_conditional_edges(
+        "plan", route_after_plan, {"memory": "memory", "final": "final"}
+    )
+    graph.add_conditional_edges(
+        "memory", route_after_memory, {"search": "search", "rag": "rag"}
+    )
+    graph.add_conditional_edges(
+        "search", route_after_search, {"summarize": "summarize", "rag": "rag"}
+    )
     graph.add_edge("summarize", "rag")
     graph.add_edge("rag", "final")
     graph.add_edge("final", END)
 
-    return graph.compile()
+    return graph.compile(checkpointer=checkpointer)
 
 
 
@@ -3,10 +3,38 @@
 """
 Memory layer for the Agent.
 Stores summarized knowledge into ChromaDB and retrieves it for RAG.
+
+Memory is partitioned by namespace (tenant or session): each namespace
+gets its own collection, so retrieval cost scales with the caller's own
+memory. Requests without a namespace use the global "agent_memory"
+collection, which namespaced requests can also read as a shared tier.
 """
 
+import hashlib
+import os
+import re
+import time
+import uuid
+
 from chromadb import Client
-from sentence_transformers import SentenceTransformer
+
+from app.agent.embeddings import get_embedder as get_configured_embedder
+from app.agent.resilience import call_external
+
+
+GLOBAL_COLLECTION = "agent_memory"
+
+# Max summaries kept per namespace partition; the oldest are evicted first (0 = unlimited)
+PARTITION_MAX_ITEMS = int(os.getenv("LIRA_MEMORY_PARTITION_MAX_ITEMS", "1000"))
+# The global / shared tier has its own cap; unlimited by default as before
+GLOBAL_MAX_ITEMS = int(os.getenv("LIRA_MEMORY_GLOBAL_MAX_ITEMS", "0"))
+# A full partition may overshoot its cap by this fraction before one
+# eviction pass trims it back, so the O(partition) scan is amortized
+EVICTION_BATCH_FRACTION = 0.1
+
+# Namespaces stored verbatim; anything else is slugged + hashed with a "."
+# separator, which verbatim names can't contain, so the mapping is injective.
+_SAFE_NAMESPACE = re.compile(r"[A-Za-z0-9_-]{0,39}[A-Za-z0-9]")
 
 
 def get_vector_client():
@@ -15,43 +43,173 @@ def get_vector_client():
 
 
 def get_embedder():
-    """Return embedding model."""
-    return SentenceTransformer("all-MiniLM-L6-v2")
+    """Return the shared embedding model (backend set by LIRA_EMBEDDING_BACKEND)."""
+    return get_configured_embedder()
 
 
-def store_summary(collection_name: str, summary_text: str):
-    """Embed and store summary into Chroma."""
-    client = get_vector_client()
-    embedder = get_embedder()
+def get_memory_collection(client, collection_name: str):
+    """Return (or create) a memory collection using cosine distance."""
+    return client.get_or_create_collection(
+        name=collection_name,
+        metadata={"hnsw:space": "cosine"}
+    )
 
-    collection = client.get_or_create_collection(name=collection_name)
 
-    embedding = embedder.encode([summary_text]).tolist()[0]
+def find_memory_collection(client, collection_name: str):
+    """Return an existing memory collection, or None; never creates one."""
+    try:
+        return client.get_collection(collection_name)
+    except Exception:
+        # Unknown collection (ValueError or NotFoundError depending on Chroma version)
+        return None
 
-    _id = collection.count()  # incremental ID
-    collection.add(
-        ids=[str(_id)],
-        documents=[summary_text],
-        embeddings=[embedding],
-    )
 
+# ---------------------------------------------------
+# Partitions
+# ---------------------------------------------------
+def partition_collection(namespace: str | None) -> str:
+    """
+    Map a namespace to its Chroma collection name.
+    Names Chroma can't hold verbatim are slugged and suffixed with a hash.
+    """
+    if not namespace:
+        return GLOBAL_COLLECTION
+    if _SAFE_NAMESPACE.fullmatch(namespace):
+        return f"{GLOBAL_COLLECTION}__{namespace}"
+
+    slug = re.sub(r"[^A-Za-z0-9_-]+", "-", namespace)[:24].strip("-_")
+    digest = hashlib.sha256(namespace.encode()).hexdigest()[:20]
+    return f"{GLOBAL_COLLECTION}__{slug}.{digest}"
+
+
+def memory_tiers(namespace: str | None, use_shared: bool = False) -> list[str]:
+    """Collections to search: the caller's partition, then the shared tier if asked."""
+    tiers = [partition_collection(namespace)]
+    if namespace and use_shared:
+        tiers.append(GLOBAL_COLLECTION)
+    return tiers
+
+
+def delete_partition(namespace: str) -> bool:
+    """Drop a namespace's whole memory in one call. Returns False if it didn't exist."""
+    if not namespace:
+        raise ValueError("namespace is required; the global memory tier can't be deleted")
+
+    client = get_vector_client()
+    name = partition_collection(namespace)
+    if find_memory_collection(client, name) is None:
+        return False
+
+    call_external("chroma", client.delete_collection, name)
+    return True
+
+
+def _max_items(collection_name: str) -> int:
+    return GLOBAL_MAX_ITEMS if collection_name == GLOBAL_COLLECTION else PARTITION_MAX_ITEMS
+
+
+def _evict_oldest(collection, max_items: int):
+    if not max_items:
+        return
+    count = call_external("chroma", collection.count)
+    if count <= max_items + max(1, int(max_items * EVICTION_BATCH_FRACTION)):
+        return
+
+    items = call_external("chroma", collection.get, include=["metadatas"])
+    created = [
+        ((meta or {}).get("created_at", 0.0), _id)
+        for _id, meta in zip(items["ids"], items["metadatas"])
+    ]
+    created.sort()
+    overflow = [_id for _, _id in created[:count - max_items]]
+    call_external("chroma", collection.delete, ids=overflow)
+
+
+# ---------------------------------------------------
+# Store / retrieve
+# ---------------------------------------------------
+def store_summary(
+    collection_name: str,
+    summary_text: str,
+    max_items: int | None = None,
+):
+    """
+    Embed and store summary into Chroma, evicting the oldest past max_items
+    (default: the partition or global-tier cap for this collection).
+    """
+    if max_items is None:
+        max_items = _max_items(collection_name)
 
-def rag_retrieve(collection_name: str, query: str) -> str:
-    """Retrieve relevant memory chunks based on query."""
     client = get_vector_client()
     embedder = get_embedder()
 
-    collection = client.get_or_create_collection(name=collection_name)
+    collection = get_memory_collection(client, collection_name)
 
-    query_emb = embedder.encode([query]).tolist()[0]
+    embedding = embedder.encode([summary_text]).tolist()[0]
 
-    results = collection.query(
-        query_embeddings=[query_emb],
-        n_results=3
+    call_external(
+        "chroma",
+        collection.add,
+        ids=[uuid.uuid4().hex],
+        documents=[summary_text],
+        embeddings=[embedding],
+        metadatas=[{"created_at": time.time()}],
     )
+    _evict_oldest(collection, max_items)
+
+
+def rag_retrieve_scored(
+    collection_names: str | list[str],
+    query: str,
+    n_results: int = 3,
+) -> tuple[str, float | None]:
+    """
+    Retrieve relevant memory chunks plus the cosine similarity of the top hit.
+    Accepts one collection or several tiers; hits are merged by distance.
+    Similarity is None when nothing is returned.
+    """
+    if isinstance(collection_names, str):
+        collection_names = [collection_names]
 
-    if not results["documents"]:
-        return ""
-
-    docs = results["documents"][0]
-    return "\n\n".join(docs)
+    client = get_vector_client()
+    embedder = get_embedder()
+    query_emb = None
+
+    hits = []
+    for name in collection_names:
+        # Reads never create: an unseen (or deleted) namespace is an empty tier
+        collection = find_memory_collection(client, name)
+        if collection is None:
+            continue
+        count = call_external("chroma", collection.count)
+        if count == 0:
+            continue
+
+        if query_emb is None:
+            query_emb = embedder.encode([query]).tolist()[0]
+
+        results = call_external(
+            "chroma",
+            collection.query,
+            query_embeddings=[query_emb],
+            n_results=min(n_results, count)
+        )
+        if not results["documents"] or not results["documents"][0]:
+            continue
+
+        docs = results["documents"][0]
+        distances = (results.get("distances") or [[]])[0] or [1.0] * len(docs)
+        hits.extend(zip(distances, docs))
+
+    if not hits:
+        return "", None
+
+    hits.sort(key=lambda hit: hit[0])
+    top = hits[:n_results]
+    return "\n\n".join(doc for _, doc in top), 1.0 - top[0][0]
+
+
+def rag_retrieve(collection_names: str | list[str], query: str) -> str:
+    """Retrieve relevant memory chunks based on query."""
+    context, _ = rag_retrieve_scored(collection_names, query)
+    return context
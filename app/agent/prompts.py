@@ -29,3 +29,33 @@ Your summary MUST include:
 - definitions (if needed)
 - skip filler text
 """
+
+MAP_SUMMARIZE_PROMPT = """
+You are an expert summarizer AI.
+The content below is ONE PART of a larger set of search results.
+Summarize this part into concise key points.
+
+Content:
+{content}
+
+Keep:
+- key facts and figures
+- important insights
+- definitions (if needed)
+Skip filler text. Do not add an introduction or conclusion.
+"""
+
+REDUCE_SUMMARIZE_PROMPT = """
+You are an expert summarizer AI.
+Below are partial summaries of different parts of the same search results.
+Merge them into one clear, concise summary.
+
+Partial summaries:
+{summaries}
+
+Your summary MUST include:
+- key facts
+- important insights
+- definitions (if needed)
+- no duplicated points
+"""
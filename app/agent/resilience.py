@@ -0,0 +1,349 @@
+# app/agent/resilience.py
+
+"""
+Resilience layer for external calls (Tavily, Ollama, Chroma).
+-------------------------------------------------------------
+Provides:
+- Per-call timeouts and a per-request deadline
+- Bounded retries with jittered exponential backoff
+- Optional hedged (duplicate) requests for tail latency
+- Circuit breakers that fail fast while a dependency is down
+
+Every external call goes through call_external(name, fn, ...), which
+applies the policy registered for that dependency in POLICIES.
+"""
+
+import contextvars
+import os
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+
+
+# ---------------------------------------------------
+# Errors
+# ---------------------------------------------------
+class DependencyUnavailable(RuntimeError):
+    """A dependency could not be reached in time; callers may degrade."""
+
+
+class DeadlineExceeded(DependencyUnavailable, TimeoutError):
+    """The per-call timeout or the per-request deadline ran out."""
+
+
+class QueueTimeout(DeadlineExceeded):
+    """
+    The call never got a free worker in time. This is local saturation,
+    not a dependency failure, so it is not charged to the circuit breaker.
+    """
+
+
+class RequestDeadlineExceeded(DeadlineExceeded):
+    """
+    The request's own deadline (not the dependency's timeout) cut the call
+    short. The budget was spent elsewhere, so this isn't charged to the
+    breaker or retried either.
+    """
+
+
+class CircuitOpenError(DependencyUnavailable):
+    """The dependency's circuit breaker is open; the call was not attempted."""
+
+
+# ---------------------------------------------------
+# Policies (env-overridable)
+# ---------------------------------------------------
+def _env_float(name: str, default: float) -> float:
+    return float(os.getenv(name, str(default)))
+
+
+# "timeout" is also passed to the underlying clients (Tavily, Ollama) so a
+# timed-out call is actually aborted instead of holding its worker thread.
+# "workers" bounds each dependency's own pool, so one hung dependency
+# can't starve the others.
+POLICIES = {
+    "tavily": {
+        "timeout": _env_float("LIRA_SEARCH_TIMEOUT", 8.0),
+        "workers": int(os.getenv("LIRA_SEARCH_WORKERS", "16")),
+        "retries": int(os.getenv("LIRA_SEARCH_RETRIES", "1")),
+        # Fire a duplicate search if the first hasn't answered by then.
+        # Set LIRA_SEARCH_HEDGE_AFTER=0 to disable hedging.
+        "hedge_after": _env_float("LIRA_SEARCH_HEDGE_AFTER", 2.0) or None,
+    },
+    "ollama": {
+        "timeout": _env_float("LIRA_LLM_TIMEOUT", 60.0),
+        "workers": int(os.getenv("LIRA_LLM_WORKERS", "16")),
+        "retries": int(os.getenv("LIRA_LLM_RETRIES", "1")),
+        "hedge_after": None,
+    },
+    "chroma": {
+        # Chroma runs in-process, so there is no client timeout to pass
+        "timeout": _env_float("LIRA_CHROMA_TIMEOUT", 5.0),
+        "workers": int(os.getenv("LIRA_CHROMA_WORKERS", "16")),
+        "retries": int(os.getenv("LIRA_CHROMA_RETRIES", "2")),
+        "hedge_after": None,
+    },
+}
+
+REQUEST_TIMEOUT = _env_float("LIRA_REQUEST_TIMEOUT", 120.0)
+
+BACKOFF_BASE = 0.2
+BACKOFF_CAP = 2.0
+
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("LIRA_BREAKER_FAILURES", "5"))
+BREAKER_RESET_TIMEOUT = _env_float("LIRA_BREAKER_RESET", 30.0)
+
+# Calls run on a per-dependency pool so a slow client never pins the caller
+_executors = {
+    name: ThreadPoolExecutor(max_workers=policy["workers"], thread_name_prefix=f"lira-{name}")
+    for name, policy in POLICIES.items()
+}
+
+
+# ---------------------------------------------------
+# Per-request deadline
+# ---------------------------------------------------
+_deadline: contextvars.ContextVar[float | None] = contextvars.ContextVar(
+    "lira_request_deadline", default=None
+)
+
+
+@contextmanager
+def request_deadline(seconds: float | None = REQUEST_TIMEOUT):
+    """Bound every external call made inside this block by one deadline."""
+    token = _deadline.set(time.monotonic() + seconds if seconds else None)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining_time() -> float | None:
+    """Seconds left on the current request deadline (None = unbounded)."""
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+def _check_deadline():
+    remaining = remaining_time()
+    if remaining is not None and remaining <= 0:
+        raise DeadlineExceeded("request deadline exceeded")
+
+
+# ---------------------------------------------------
+# Circuit breaker
+# ---------------------------------------------------
+class CircuitBreaker:
+    """
+    Classic three-state breaker.
+    closed -> open after `failure_threshold` consecutive failures;
+    open -> half_open after `reset_timeout` seconds, letting one probe through;
+    half_open -> closed on success, back to open on failure.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = BREAKER_FAILURE_THRESHOLD,
+        reset_timeout: float = BREAKER_RESET_TIMEOUT,
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at: float | None = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if time.monotonic() - self._opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow_request(self) -> bool:
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half_open" and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def release_probe(self):
+        """Give back a half-open probe that never reached the dependency."""
+        with self._lock:
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._probing or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+            self._probing = False
+
+
+_breakers: dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(name: str) -> CircuitBreaker:
+    with _breakers_lock:
+        if name not in _breakers:
+            _breakers[name] = CircuitBreaker(name)
+        return _breakers[name]
+
+
+def is_available(name: str) -> bool:
+    """Cheap check callers can use to pick a degraded path up front."""
+    return get_breaker(name).state != "open"
+
+
+# ---------------------------------------------------
+# Calling
+# ---------------------------------------------------
+def _start(name, fn, args, kwargs):
+    """Submit fn to the dependency's pool; returns (future, started event, start time box)."""
+    started = threading.Event()
+    started_at = []
+
+    def task():
+        started_at.append(time.monotonic())
+        started.set()
+        return fn(*args, **kwargs)
+
+    # Carry the request deadline into the worker thread
+    future = _executors[name].submit(contextvars.copy_context().run, task)
+    return future, started, started_at
+
+
+def map_concurrent(fn, items: list, max_workers: int, return_exceptions: bool = False) -> list:
+    """
+    Run fn over items on a bounded pool, preserving order and the request
+    deadline. With return_exceptions=True failures are returned in place
+    of results instead of raising the first one.
+    """
+    if not items:
+        return []
+
+    def run(item):
+        try:
+            return fn(item)
+        except Exception as e:
+            if return_exceptions:
+                return e
+            raise
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(items)))) as pool:
+        futures = [pool.submit(contextvars.copy_context().run, run, item) for item in items]
+        return [f.result() for f in futures]
+
+
+def _run_once(name, fn, args, kwargs, timeout: float, hedge_after: float | None):
+    """
+    Run fn with `timeout` seconds measured from when it starts running
+    (time queued for a worker doesn't count), capped by the request
+    deadline, optionally hedging with a duplicate.
+    """
+    future, started, started_at = _start(name, fn, args, kwargs)
+
+    # Queue wait is bounded by the request deadline (or one timeout if none)
+    queue_wait = remaining_time()
+    if queue_wait is None:
+        queue_wait = timeout
+    if not started.wait(timeout=max(0.0, queue_wait)) and future.cancel():
+        raise QueueTimeout(f"{name} call waited {queue_wait:.1f}s for a free worker")
+    started.wait()  # cancel() failed, so it has just started
+
+    end = started_at[0] + timeout
+    cut_by_deadline = False
+    remaining = remaining_time()
+    if remaining is not None and time.monotonic() + remaining < end:
+        end = time.monotonic() + remaining
+        cut_by_deadline = True
+
+    futures = [future]
+    if hedge_after is not None and started_at[0] + hedge_after < end:
+        done, _ = wait(futures, timeout=max(0.0, started_at[0] + hedge_after - time.monotonic()))
+        if not done:
+            futures.append(_start(name, fn, args, kwargs)[0])
+
+    last_error = None
+    while futures:
+        done, pending = wait(
+            futures,
+            timeout=max(0.0, end - time.monotonic()),
+            return_when=FIRST_COMPLETED,
+        )
+        if not done:
+            for f in pending:
+                f.cancel()
+            if cut_by_deadline:
+                raise RequestDeadlineExceeded(
+                    f"{name} call cut off by the request deadline after {end - started_at[0]:.1f}s"
+                )
+            raise DeadlineExceeded(f"{name} call timed out after {end - started_at[0]:.1f}s")
+
+        for f in done:
+            if f.exception() is None:
+                for other in pending:
+                    other.cancel()
+                return f.result()
+            last_error = f.exception()
+        futures = list(pending)
+
+    raise last_error
+
+
+def call_external(name: str, fn, *args, hedge: bool = True, **kwargs):
+    """
+    Call fn(*args, **kwargs) under the policy registered for `name`:
+    circuit breaker, deadline-bounded timeout, hedging and jittered retries.
+    Pass hedge=False to skip the policy's hedged duplicate for this call.
+    """
+    policy = POLICIES[name]
+    breaker = get_breaker(name)
+    attempt = 0
+
+    while True:
+        _check_deadline()
+        if not breaker.allow_request():
+            raise CircuitOpenError(f"{name} is unavailable (circuit open)")
+
+        try:
+            hedge_after = policy["hedge_after"] if hedge else None
+            result = _run_once(name, fn, args, kwargs, policy["timeout"], hedge_after)
+        except (QueueTimeout, RequestDeadlineExceeded):
+            # Our pool was full, or the request ran out of budget before the
+            # dependency's own timeout; the dependency itself didn't fail
+            breaker.release_probe()
+            raise
+        except Exception:
+            breaker.record_failure()
+            if attempt >= policy["retries"]:
+                raise
+
+            # Full jitter backoff, never sleeping past the request deadline
+            delay = random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+            remaining = remaining_time()
+            if remaining is not None and delay >= remaining:
+                raise
+            time.sleep(delay)
+            attempt += 1
+            continue
+
+        breaker.record_success()
+        return result
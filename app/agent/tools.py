@@ -5,23 +5,52 @@ Real web search tool using Tavily API.
 """
 
 import os
+import httpx
 from tavily import TavilyClient
 from dotenv import load_dotenv
 
+from app.agent.resilience import POLICIES, call_external, map_concurrent
+
 load_dotenv()
 
 tavily = TavilyClient(api_key=os.getenv("TAVILY_API_KEY"))
 
+# Max concurrent Tavily requests for one multi-query search.
+# 0 (default) runs every sub-query at once, so the search stage takes
+# about one search of wall-clock time.
+SEARCH_FANOUT = int(os.getenv("LIRA_SEARCH_FANOUT", "0"))
+
+# Optional Tavily-compatible endpoint (e.g. the load-test stand-in).
+# Receives {"query", "max_results"} and returns {"results": [...]}.
+SEARCH_URL = os.getenv("LIRA_SEARCH_URL")
 
-def web_search(query: str) -> str:
-    """
-    Returns search results as a clean text string for summarization.
-    """
-    results = tavily.search(query=query, max_results=3)
 
+def _search(query: str, max_results: int) -> dict:
+    if SEARCH_URL:
+        resp = httpx.post(
+            SEARCH_URL,
+            json={"query": query, "max_results": max_results},
+            timeout=POLICIES["tavily"]["timeout"],
+        )
+        resp.raise_for_status()
+        return resp.json()
+    return tavily.search(
+        query=query,
+        max_results=max_results,
+        timeout=POLICIES["tavily"]["timeout"],
+    )
+
+
+def search_results(query: str, max_results: int = 3, hedge: bool = True) -> list[dict]:
+    """Raw Tavily results (title, url, content, ...) for one query."""
+    return call_external("tavily", _search, query, max_results, hedge=hedge)["results"]
+
+
+def format_results(results: list[dict]) -> str:
+    """Render results as a clean text string for summarization."""
     final_text = ""
 
-    for res in results["results"]:
+    for res in results:
         title = res.get("title", "")
         content = res.get("content", "")
         url = res.get("url", "")
@@ -29,3 +58,48 @@ def web_search(query: str) -> str:
         final_text += f"Title: {title}\nURL: {url}\n{content}\n\n"
 
     return final_text.strip()
+
+
+def web_search(query: str) -> str:
+    """
+    Returns search results as a clean text string for summarization.
+    """
+    return format_results(search_results(query))
+
+
+def web_search_many(queries: list[str], max_results: int = 3, max_workers: int = SEARCH_FANOUT) -> str:
+    """
+    Run several queries concurrently and merge their results, dropping
+    duplicate URLs. Earlier queries keep priority in the merged order.
+    Fails only if every query fails; partial results are returned otherwise.
+    """
+    # Hedging a fan-out would double Tavily calls per request; a single
+    # query keeps the policy's hedge since it's the only tail-latency guard.
+    hedge = len(queries) == 1
+    batches = map_concurrent(
+        lambda q: search_results(q, max_results, hedge=hedge),
+        queries,
+        max_workers or len(queries),
+        return_exceptions=True,
+    )
+
+    errors = [b for b in batches if isinstance(b, Exception)]
+    if len(errors) == len(batches):
+        raise errors[0]
+    for q, b in zip(queries, batches):
+        if isinstance(b, Exception):
+            print(f"[web_search_many] Sub-query failed ({q!r}): {b}")
+
+    merged, seen = [], set()
+    for batch in batches:
+        if isinstance(batch, Exception):
+            continue
+        for res in batch:
+            key = res.get("url") or res.get("title")
+            if key:
+                if key in seen:
+                    continue
+                seen.add(key)
+            merged.append(res)
+
+    return format_results(merged)
@@ -2,6 +2,12 @@ from pydantic import BaseModel
 
 class QueryRequest(BaseModel):
     query: str
+    # Retries with the same id resume from the last completed node
+    request_id: str | None = None
+    # Memory partition (tenant or session id); omit for global memory
+    namespace: str | None = None
+    # Also search the global memory tier alongside the namespace's partition
+    use_shared_memory: bool = False
 
 class AgentResponse(BaseModel):
     query: str
@@ -12,4 +18,14 @@ class AgentResponse(BaseModel):
 
     blocked: bool = False              # ← FIXED
     safety_note: str | None = None
-    error: str | None = None
\ No newline at end of file
+    error: str | None = None
+
+    route: str | None = None
+    memory_score: float | None = None
+    skipped_nodes: list[str] = []
+    llm_calls_avoided: int = 0
+
+
+class MemoryDeleteResponse(BaseModel):
+    namespace: str
+    deleted: bool
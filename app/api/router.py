@@ -1,21 +1,42 @@
 # app/api/router.py
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Header, HTTPException
 from fastapi.responses import JSONResponse
 from fastapi.requests import Request
 from sse_starlette.sse import EventSourceResponse
 
-from .models import QueryRequest, AgentResponse
-from .service import run_agent_sync, run_agent_event_stream
+from .models import QueryRequest, AgentResponse, MemoryDeleteResponse
+from .service import (
+    RunInProgress,
+    delete_memory_partition,
+    run_agent_event_stream,
+    run_agent_sync,
+)
 
 api_router = APIRouter()
 
 
+def _request_id(payload: QueryRequest, idempotency_key: str | None) -> str | None:
+    """Body request_id wins; otherwise fall back to the Idempotency-Key header."""
+    return payload.request_id or idempotency_key
+
+
 @api_router.post("/query", response_model=AgentResponse)
-def query_sync(payload: QueryRequest):
+def query_sync(
+    payload: QueryRequest,
+    idempotency_key: str | None = Header(default=None, alias="Idempotency-Key"),
+):
     """
     Stable synchronous API.
     """
-    result = run_agent_sync(payload.query)
+    try:
+        result = run_agent_sync(
+            payload.query,
+            _request_id(payload, idempotency_key),
+            payload.namespace,
+            payload.use_shared_memory,
+        )
+    except RunInProgress as e:
+        raise HTTPException(status_code=409, detail=str(e))
 
     if result.get("error"):
         raise HTTPException(status_code=500, detail=result["error"])
@@ -29,19 +50,41 @@ def query_sync(payload: QueryRequest):
         blocked=result.get("blocked", False),
         safety_note=result.get("safety_note"),
         error=result.get("error"),
+        route=result.get("route"),
+        memory_score=result.get("memory_score"),
+        skipped_nodes=result.get("skipped_nodes") or [],
+        llm_calls_avoided=result.get("llm_calls_avoided", 0),
     )
 
 
 @api_router.post("/query/stream")
-async def query_stream(payload: QueryRequest):
+async def query_stream(
+    payload: QueryRequest,
+    idempotency_key: str | None = Header(default=None, alias="Idempotency-Key"),
+):
     """
     SSE endpoint.
     """
+    request_id = _request_id(payload, idempotency_key)
+
     async def event_gen():
-        for ev in run_agent_event_stream(payload.query):
+        for ev in run_agent_event_stream(
+            payload.query, request_id, payload.namespace, payload.use_shared_memory
+        ):
             yield {
                 "event": ev["event"],
                 "data": str(ev.get("data", "")),
             }
 
     return EventSourceResponse(event_gen())
+
+
+@api_router.delete("/memory/{namespace}", response_model=MemoryDeleteResponse)
+def delete_memory(namespace: str):
+    """
+    Drop a namespace's entire memory partition.
+    """
+    return MemoryDeleteResponse(
+        namespace=namespace,
+        deleted=delete_memory_partition(namespace),
+    )
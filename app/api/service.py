@@ -1,14 +1,108 @@
 # app/api/service.py
+import json
 import logging
+import os
+import sqlite3
+import threading
 import time
 from typing import Dict, Any
 
+from langgraph.checkpoint.sqlite import SqliteSaver
+
 from app.agent.graph import build_graph, AgentState
+from app.agent.memory import delete_partition
+from app.agent.resilience import REQUEST_TIMEOUT, request_deadline
 
 logger = logging.getLogger("lira.api.service")
 
+# Local SQLite store for checkpointed (request-id keyed) runs
+CHECKPOINT_DB = os.getenv("LIRA_CHECKPOINT_DB", "lira_checkpoints.sqlite")
+# Finished runs (and their checkpoints) are pruned after this many hours
+CHECKPOINT_RETENTION_HOURS = float(os.getenv("LIRA_CHECKPOINT_RETENTION_HOURS", "24"))
+# A "running" claim older than this belongs to a dead worker and may be taken over
+RUN_LEASE_SECONDS = REQUEST_TIMEOUT * 2
+PRUNE_INTERVAL_SECONDS = 600
+
+
+class RunInProgress(RuntimeError):
+    """Another request with the same request_id is still running."""
+
+
+class RunLedger:
+    """
+    Bookkeeping for checkpointed runs, stored next to the checkpoints:
+    - at most one in-flight run per thread_id, across threads and worker
+      processes sharing the DB (a concurrent duplicate gets RunInProgress)
+    - finished runs are pruned after CHECKPOINT_RETENTION_HOURS
+    """
+
+    def __init__(self, path: str, checkpointer: SqliteSaver):
+        self._conn = sqlite3.connect(
+            path, check_same_thread=False, timeout=30, isolation_level=None
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS lira_runs ("
+            "thread_id TEXT PRIMARY KEY, status TEXT NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._checkpointer = checkpointer
+        self._lock = threading.Lock()
+        self._last_prune = 0.0
+
+    def claim(self, thread_id: str):
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT status, updated_at FROM lira_runs WHERE thread_id = ?",
+                    (thread_id,),
+                ).fetchone()
+                if row and row[0] == "running" and now - row[1] < RUN_LEASE_SECONDS:
+                    raise RunInProgress(f"run '{thread_id}' is already in progress")
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO lira_runs VALUES (?, 'running', ?)",
+                    (thread_id, now),
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def release(self, thread_id: str):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE lira_runs SET status = 'finished', updated_at = ? WHERE thread_id = ?",
+                (time.time(), thread_id),
+            )
+
+    def prune(self):
+        """Drop checkpoints of runs finished longer ago than the retention window."""
+        now = time.time()
+        if now - self._last_prune < PRUNE_INTERVAL_SECONDS:
+            return
+        self._last_prune = now
+
+        cutoff = now - CHECKPOINT_RETENTION_HOURS * 3600
+        with self._lock:
+            expired = [
+                row[0] for row in self._conn.execute(
+                    "SELECT thread_id FROM lira_runs WHERE status = 'finished' AND updated_at < ?",
+                    (cutoff,),
+                )
+            ]
+        for thread_id in expired:
+            self._checkpointer.delete_thread(thread_id)
+            with self._lock:
+                self._conn.execute("DELETE FROM lira_runs WHERE thread_id = ?", (thread_id,))
+        if expired:
+            logger.info("Pruned %d expired checkpointed runs", len(expired))
+
+
 logger.info("Loading LangGraph workflow...")
+_checkpointer = SqliteSaver(sqlite3.connect(CHECKPOINT_DB, check_same_thread=False))
+run_ledger = RunLedger(CHECKPOINT_DB, _checkpointer)
 workflow = build_graph()
+checkpointed_workflow = build_graph(checkpointer=_checkpointer)
 logger.info("LangGraph workflow loaded.")
 
 
@@ -39,21 +133,84 @@ def _normalize_result(result: Any) -> Dict[str, Any]:
         "blocked",
         "safety_note",
         "error",
+        "route",
+        "memory_score",
+        "skipped_nodes",
+        "llm_calls_avoided",
     ):
         if hasattr(result, key):
             data[key] = getattr(result, key)
     return data
 
 
-def run_agent_sync(query: str) -> Dict[str, Any]:
+def _invoke_checkpointed(initial: AgentState, request_id: str) -> Any:
+    """
+    Run the graph under a checkpoint keyed by request_id.
+
+    - New id: run from the start, checkpointing after every node.
+    - Id whose last run failed mid-graph: resume from the failed node,
+      reusing the stored state of every node that already completed.
+    - Id whose run already completed: return the stored result.
+    - Id with a run still in flight: RunInProgress.
+    """
+    # Scope ids per namespace so tenants can't resume each other's runs.
+    # JSON-encoding the pair keeps distinct (namespace, id) pairs distinct.
+    thread_id = json.dumps([initial.namespace, request_id])
+    config = {"configurable": {"thread_id": thread_id}}
+
+    run_ledger.prune()
+    run_ledger.claim(thread_id)
+    try:
+        snapshot = checkpointed_workflow.get_state(config)
+
+        if not snapshot.values:
+            return checkpointed_workflow.invoke(initial, config)
+
+        if (
+            snapshot.values.get("query") != initial.query
+            or snapshot.values.get("use_shared_memory") != initial.use_shared_memory
+        ):
+            raise ValueError(
+                f"request_id '{request_id}' was already used for a different request"
+            )
+
+        if snapshot.next:
+            logger.info("Resuming run %s at %s", request_id, list(snapshot.next))
+            return checkpointed_workflow.invoke(None, config)
+
+        logger.info("Run %s already completed; returning stored result", request_id)
+        return snapshot.values
+    finally:
+        run_ledger.release(thread_id)
+
+
+def run_agent_sync(
+    query: str,
+    request_id: str | None = None,
+    namespace: str | None = None,
+    use_shared_memory: bool = False,
+) -> Dict[str, Any]:
     """
     Run agent and return normalized state.
     Always includes query.
+
+    When request_id is given the run is checkpointed, so retrying with
+    the same id resumes instead of restarting. namespace selects the
+    caller's memory partition.
     """
-    initial = AgentState(query=query)
+    initial = AgentState(
+        query=query,
+        namespace=namespace,
+        use_shared_memory=use_shared_memory,
+    )
 
     try:
-        res = workflow.invoke(initial)
+        # Every external call in this run shares one deadline (LIRA_REQUEST_TIMEOUT)
+        with request_deadline():
+            if request_id:
+                res = _invoke_checkpointed(initial, request_id)
+            else:
+                res = workflow.invoke(initial)
         data = _normalize_result(res)
 
         # 🔒 Enforce minimal contract
@@ -61,8 +218,18 @@ def run_agent_sync(query: str) -> Dict[str, Any]:
         data.setdefault("blocked", False)
         data.setdefault("error", None)
 
+        logger.info(
+            "Agent route=%s skipped=%s llm_calls_avoided=%s",
+            data.get("route"),
+            data.get("skipped_nodes"),
+            data.get("llm_calls_avoided"),
+        )
         return data
 
+    except RunInProgress:
+        # Not a failure of this run; let the API answer 409
+        raise
+
     except Exception as e:
         logger.exception("Agent run failed")
         return {
@@ -72,14 +239,19 @@ def run_agent_sync(query: str) -> Dict[str, Any]:
         }
 
 
-def run_agent_event_stream(query: str):
+def run_agent_event_stream(
+    query: str,
+    request_id: str | None = None,
+    namespace: str | None = None,
+    use_shared_memory: bool = False,
+):
     """
     Simplified SSE generator.
     """
     yield {"event": "start", "data": "Agent started"}
 
     try:
-        res = run_agent_sync(query)
+        res = run_agent_sync(query, request_id, namespace, use_shared_memory)
 
         for key in (
             "plan",
@@ -89,6 +261,7 @@ def run_agent_event_stream(query: str):
             "blocked",
             "safety_note",
             "error",
+            "route",
         ):
             if res.get(key) is not None:
                 yield {"event": key, "data": res[key]}
@@ -98,3 +271,10 @@ def run_agent_event_stream(query: str):
 
     except Exception as e:
         yield {"event": "error", "data": str(e)}
+
+
+def delete_memory_partition(namespace: str) -> bool:
+    """Drop all stored memory for one namespace."""
+    deleted = delete_partition(namespace)
+    logger.info("Memory partition %r %s", namespace, "deleted" if deleted else "not found")
+    return deleted
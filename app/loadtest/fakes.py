@@ -0,0 +1,253 @@
+# app/loadtest/fakes.py
+
+"""
+Local stand-ins for Ollama and Tavily, used by the load-test harness.
+--------------------------------------------------------------------
+- FakeOllama: serves /api/chat and /api/generate (streaming NDJSON or
+  single JSON) with a configurable time-to-first-token and token rate.
+- FakeSearch: serves a Tavily-shaped POST /search with configurable latency.
+
+Both run on stdlib ThreadingHTTPServer in a background thread, so no
+network access or API keys are needed.
+"""
+
+import hashlib
+import json
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+FAKE_PLAN = json.dumps({
+    "objective": "Answer the user's question",
+    "steps": [
+        "Search for an overview of the topic",
+        "Search for recent developments",
+        "Search for common criticisms",
+        "Summarize findings",
+    ],
+    "tools": ["web_search", "summarizer", "rag"],
+    "output_format": "Short report",
+})
+
+WORDS = (
+    "latency throughput model vector memory search summary context token "
+    "agent graph node retrieval answer research result signal benchmark"
+).split()
+
+
+def _jittered(base: float, jitter: float) -> float:
+    return max(0.0, base + random.uniform(-jitter, jitter))
+
+
+class _QuietHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _read_json(self) -> dict:
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def _send_json(self, payload: dict, status: int = 200):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class _FakeServer:
+    """Run a handler class on a background ThreadingHTTPServer."""
+
+    def __init__(self, handler_cls, host: str = "127.0.0.1", port: int = 0):
+        self.httpd = ThreadingHTTPServer((host, port), handler_cls)
+        self.httpd.daemon_threads = True
+        self.httpd.config = self
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+# ---------------------------------------------------
+# Fake Ollama
+# ---------------------------------------------------
+class _OllamaHandler(_QuietHandler):
+
+    def do_GET(self):
+        if self.path == "/api/tags":
+            self._send_json({"models": [{"name": "llama3.2:latest", "model": "llama3.2:latest"}]})
+        elif self.path in ("/", "/api/version"):
+            self._send_json({"version": "fake"})
+        else:
+            self._send_json({"error": "not found"}, status=404)
+
+    def do_POST(self):
+        if self.path == "/api/show":
+            self._send_json({"modelfile": "", "parameters": "", "template": "", "details": {}})
+            return
+        if self.path not in ("/api/chat", "/api/generate"):
+            self._send_json({"error": "not found"}, status=404)
+            return
+
+        cfg: FakeOllama = self.server.config
+        request = self._read_json()
+        chat = self.path == "/api/chat"
+        prompt = (
+            " ".join(m.get("content", "") for m in request.get("messages", []))
+            if chat else request.get("prompt", "")
+        )
+        tokens = cfg.completion_tokens(prompt)
+
+        time.sleep(_jittered(cfg.ttft, cfg.jitter))
+
+        if request.get("stream", True):
+            self._stream(request, tokens, chat)
+        else:
+            time.sleep(len(tokens) / cfg.tokens_per_sec)
+            self._send_json(self._chunk(request, "".join(tokens), chat, done=True, count=len(tokens)))
+
+    def _chunk(self, request: dict, text: str, chat: bool, done: bool, count: int = 0) -> dict:
+        chunk = {
+            "model": request.get("model", "llama3.2"),
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "done": done,
+        }
+        if chat:
+            chunk["message"] = {"role": "assistant", "content": text}
+        else:
+            chunk["response"] = text
+        if done:
+            chunk.update({
+                "done_reason": "stop",
+                "total_duration": 0,
+                "load_duration": 0,
+                "prompt_eval_count": 0,
+                "prompt_eval_duration": 0,
+                "eval_count": count,
+                "eval_duration": 0,
+            })
+        return chunk
+
+    def _stream(self, request: dict, tokens: list[str], chat: bool):
+        cfg: FakeOllama = self.server.config
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def write(payload: dict):
+            line = (json.dumps(payload) + "\n").encode()
+            self.wfile.write(f"{len(line):x}\r\n".encode() + line + b"\r\n")
+            self.wfile.flush()
+
+        interval = 1.0 / cfg.tokens_per_sec
+        for tok in tokens:
+            write(self._chunk(request, tok, chat, done=False))
+            time.sleep(interval)
+        write(self._chunk(request, "", chat, done=True, count=len(tokens)))
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+
+class FakeOllama(_FakeServer):
+    """
+    Ollama stand-in.
+    ttft: seconds before the first token; tokens_per_sec: decode rate;
+    tokens: completion length; jitter: +/- seconds added to ttft.
+    Planner prompts get a JSON plan so plan parsing has something real.
+    """
+
+    def __init__(
+        self,
+        ttft: float = 0.2,
+        tokens_per_sec: float = 50.0,
+        tokens: int = 80,
+        jitter: float = 0.0,
+        **kwargs,
+    ):
+        self.ttft = ttft
+        self.tokens_per_sec = tokens_per_sec
+        self.tokens = tokens
+        self.jitter = jitter
+        super().__init__(_OllamaHandler, **kwargs)
+
+    def completion_tokens(self, prompt: str) -> list[str]:
+        if "research planner" in prompt:
+            text = FAKE_PLAN
+            size = max(1, len(text) // self.tokens)
+            return [text[i:i + size] for i in range(0, len(text), size)]
+        return [random.choice(WORDS) + " " for _ in range(self.tokens)]
+
+
+# ---------------------------------------------------
+# Fake search (Tavily-shaped)
+# ---------------------------------------------------
+class _SearchHandler(_QuietHandler):
+
+    def do_POST(self):
+        if self.path != "/search":
+            self._send_json({"error": "not found"}, status=404)
+            return
+
+        cfg: FakeSearch = self.server.config
+        request = self._read_json()
+        query = request.get("query", "")
+
+        time.sleep(_jittered(cfg.latency, cfg.jitter))
+        if cfg.error_rate and random.random() < cfg.error_rate:
+            self._send_json({"error": "injected failure"}, status=503)
+            return
+
+        digest = hashlib.sha1(query.encode()).hexdigest()[:10]
+        results = [
+            {
+                "title": f"Result {i} for {query}",
+                "url": f"https://example.test/{digest}/{i}",
+                "content": " ".join(random.choice(WORDS) for _ in range(cfg.content_words)),
+                "score": round(1.0 - i * 0.1, 2),
+            }
+            for i in range(int(request.get("max_results", 3)))
+        ]
+        self._send_json({"query": query, "results": results})
+
+
+class FakeSearch(_FakeServer):
+    """
+    Tavily stand-in at POST /search.
+    latency/jitter: response delay; content_words: words per result;
+    error_rate: fraction of requests answered with a 503.
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.3,
+        jitter: float = 0.0,
+        content_words: int = 120,
+        error_rate: float = 0.0,
+        **kwargs,
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.content_words = content_words
+        self.error_rate = error_rate
+        super().__init__(_SearchHandler, **kwargs)
+
+    @property
+    def search_url(self) -> str:
+        return f"{self.url}/search"
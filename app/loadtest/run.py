@@ -0,0 +1,324 @@
+# app/loadtest/run.py
+
+"""
+End-to-end load test for the Lira API.
+--------------------------------------
+1. Starts FakeOllama + FakeSearch locally (see fakes.py)
+2. Starts the API under uvicorn pointed at them (or uses --target)
+3. Drives /api/query and/or /api/query/stream at a fixed concurrency
+   (closed loop) or a fixed arrival rate (--rps, open loop)
+4. Reports throughput, p50/p95/p99 latency, SSE time-to-first-event
+   and error rates
+
+Example:
+    python -m app.loadtest.run --concurrency 8 --duration 30
+    python -m app.loadtest.run --rps 5 --endpoint stream --llm-tps 30
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from app.loadtest.fakes import FakeOllama, FakeSearch
+
+
+# Open loop: a request starting this much after its scheduled arrival
+# is reported as delayed by the concurrency cap
+LATE_START_TOLERANCE = 0.01
+
+TOPICS = [
+    "quantum computing", "vector databases", "solar panels", "CRISPR",
+    "rust ownership", "transformers", "carbon capture", "zero trust networking",
+    "fusion energy", "edge computing", "protein folding", "RISC-V",
+]
+
+
+# ---------------------------------------------------
+# Stats
+# ---------------------------------------------------
+def percentile(values: list[float], pct: float) -> float | None:
+    if not values:
+        return None
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * pct / 100
+    lo, hi = int(k), min(int(k) + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+
+class EndpointStats:
+    def __init__(self, name: str):
+        self.name = name
+        self.latencies: list[float] = []
+        self.ttfe: list[float] = []          # time to first SSE event
+        self.ttfd: list[float] = []          # time to first non-"start" SSE event
+        self.errors: dict[str, int] = {}
+        self.delayed = 0                     # open loop: started late due to the concurrency cap
+
+    @property
+    def requests(self) -> int:
+        return len(self.latencies) + sum(self.errors.values())
+
+    def error(self, kind: str):
+        self.errors[kind] = self.errors.get(kind, 0) + 1
+
+    def report(self, elapsed: float) -> dict:
+        def ms(v):
+            return None if v is None else round(v * 1000, 1)
+
+        total = self.requests
+        return {
+            "endpoint": self.name,
+            "requests": total,
+            "ok": len(self.latencies),
+            "error_rate": round(sum(self.errors.values()) / total, 4) if total else 0.0,
+            "errors": self.errors,
+            "delayed_by_cap": self.delayed,
+            "throughput_rps": round(len(self.latencies) / elapsed, 2) if elapsed else 0.0,
+            "latency_ms": {p: ms(percentile(self.latencies, int(p[1:]))) for p in ("p50", "p95", "p99")},
+            "ttfe_ms": {p: ms(percentile(self.ttfe, int(p[1:]))) for p in ("p50", "p95", "p99")},
+            "ttf_data_ms": {p: ms(percentile(self.ttfd, int(p[1:]))) for p in ("p50", "p95", "p99")},
+        }
+
+
+# ---------------------------------------------------
+# Requests
+# ---------------------------------------------------
+def make_query(i: int, distinct: int) -> str:
+    n = i % distinct if distinct else i
+    return f"Explain {TOPICS[n % len(TOPICS)]} (variant {n})"
+
+
+# In open-loop mode `scheduled` is the intended arrival time, so time spent
+# queued behind the concurrency cap counts toward latency (no coordinated omission).
+async def hit_query(client: httpx.AsyncClient, stats: EndpointStats, query: str, scheduled: float | None = None):
+    start = scheduled if scheduled is not None else time.perf_counter()
+    try:
+        resp = await client.post("/api/query", json={"query": query})
+    except httpx.HTTPError as e:
+        stats.error(type(e).__name__)
+        return
+    if resp.status_code != 200:
+        stats.error(f"http_{resp.status_code}")
+        return
+    stats.latencies.append(time.perf_counter() - start)
+
+
+async def hit_stream(client: httpx.AsyncClient, stats: EndpointStats, query: str, scheduled: float | None = None):
+    start = scheduled if scheduled is not None else time.perf_counter()
+    first_event = first_data = None
+    failed = None
+    try:
+        async with client.stream("POST", "/api/query/stream", json={"query": query}) as resp:
+            if resp.status_code != 200:
+                stats.error(f"http_{resp.status_code}")
+                return
+            async for line in resp.aiter_lines():
+                if not line.startswith("event:"):
+                    continue
+                event = line.split(":", 1)[1].strip()
+                now = time.perf_counter() - start
+                if first_event is None:
+                    first_event = now
+                if first_data is None and event not in ("start", "ping"):
+                    first_data = now
+                if event == "error":
+                    failed = "sse_error"
+    except httpx.HTTPError as e:
+        stats.error(type(e).__name__)
+        return
+
+    if failed:
+        stats.error(failed)
+        return
+    stats.latencies.append(time.perf_counter() - start)
+    if first_event is not None:
+        stats.ttfe.append(first_event)
+    if first_data is not None:
+        stats.ttfd.append(first_data)
+
+
+# ---------------------------------------------------
+# Load generation
+# ---------------------------------------------------
+async def drive(args, base_url: str) -> tuple[list[EndpointStats], float]:
+    endpoints = ["query", "stream"] if args.endpoint == "both" else [args.endpoint]
+    stats = {name: EndpointStats(name) for name in endpoints}
+    hitters = {"query": hit_query, "stream": hit_stream}
+
+    limits = httpx.Limits(max_connections=max(args.concurrency, 1) * 2)
+    timeout = httpx.Timeout(args.request_timeout)
+    counter = 0
+
+    def next_job():
+        nonlocal counter
+        name = endpoints[counter % len(endpoints)]
+        query = make_query(counter, args.distinct_queries)
+        counter += 1
+        return name, query
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=timeout) as client:
+        start = time.perf_counter()
+        stop_at = start + args.duration
+
+        if args.rps:
+            # Open loop: fixed arrival rate, capped at --concurrency in flight
+            sem = asyncio.Semaphore(args.concurrency)
+            tasks = []
+
+            async def one(name, query, scheduled):
+                async with sem:
+                    if time.perf_counter() - scheduled > LATE_START_TOLERANCE:
+                        stats[name].delayed += 1
+                    await hitters[name](client, stats[name], query, scheduled)
+
+            interval = 1.0 / args.rps
+            next_at = start
+            while time.perf_counter() < stop_at:
+                tasks.append(asyncio.create_task(one(*next_job(), next_at)))
+                next_at += interval
+                await asyncio.sleep(max(0.0, next_at - time.perf_counter()))
+            await asyncio.gather(*tasks)
+        else:
+            # Closed loop: N workers issuing back-to-back requests
+            async def worker():
+                while time.perf_counter() < stop_at:
+                    name, query = next_job()
+                    await hitters[name](client, stats[name], query)
+
+            await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+
+        elapsed = time.perf_counter() - start
+
+    return list(stats.values()), elapsed
+
+
+# ---------------------------------------------------
+# Service lifecycle
+# ---------------------------------------------------
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_service(args, ollama: FakeOllama, search: FakeSearch, workdir: str):
+    port = _free_port()
+    env = dict(
+        os.environ,
+        OLLAMA_HOST=ollama.url,
+        LIRA_SEARCH_URL=search.search_url,
+        TAVILY_API_KEY=os.getenv("TAVILY_API_KEY") or "loadtest",
+        LIRA_CHECKPOINT_DB=os.path.join(workdir, "checkpoints.sqlite"),
+        HF_HUB_OFFLINE=os.getenv("HF_HUB_OFFLINE", "1"),
+    )
+    cmd = [
+        sys.executable, "-m", "uvicorn", "app.api.main:app",
+        "--host", "127.0.0.1", "--port", str(port),
+        "--workers", str(args.workers), "--log-level", "warning",
+    ]
+    proc = subprocess.Popen(cmd, env=env)
+    base_url = f"http://127.0.0.1:{port}"
+
+    deadline = time.monotonic() + args.startup_timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"API exited during startup (code {proc.returncode})")
+        try:
+            if httpx.get(f"{base_url}/health", timeout=1).status_code == 200:
+                return proc, base_url
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+
+    proc.terminate()
+    raise RuntimeError("API did not become healthy in time")
+
+
+def print_report(reports: list[dict], elapsed: float):
+    print(f"\n=== LOAD TEST ({elapsed:.1f}s) ===")
+    for r in reports:
+        lat, ttfe, ttfd = r["latency_ms"], r["ttfe_ms"], r["ttf_data_ms"]
+        print(f"\n[{r['endpoint']}]")
+        print(f"  requests     {r['requests']}  ok {r['ok']}  error rate {r['error_rate']:.2%}")
+        if r["delayed_by_cap"]:
+            print(f"  delayed      {r['delayed_by_cap']} started late (concurrency cap)")
+        if r["errors"]:
+            print(f"  errors       {r['errors']}")
+        print(f"  throughput   {r['throughput_rps']} req/s")
+        print(f"  latency ms   p50 {lat['p50']}  p95 {lat['p95']}  p99 {lat['p99']}")
+        if r["endpoint"] == "stream":
+            print(f"  TTFE ms      p50 {ttfe['p50']}  p95 {ttfe['p95']}  p99 {ttfe['p99']}")
+            print(f"  TTF-data ms  p50 {ttfd['p50']}  p95 {ttfd['p95']}  p99 {ttfd['p99']}")
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="Load test the Lira API against local fakes.")
+    p.add_argument("--target", help="Existing API base URL; skips starting fakes and the API")
+    p.add_argument("--endpoint", choices=["query", "stream", "both"], default="both")
+    p.add_argument("--concurrency", type=int, default=4, help="Workers (closed loop) or max in flight (--rps)")
+    p.add_argument("--rps", type=float, help="Open-loop arrival rate; omit for closed loop")
+    p.add_argument("--duration", type=float, default=30.0, help="Seconds to generate load")
+    p.add_argument("--distinct-queries", type=int, default=0,
+                   help="Cycle through N distinct queries (exercises memory hits); 0 = all unique")
+    p.add_argument("--request-timeout", type=float, default=300.0)
+    p.add_argument("--workers", type=int, default=1, help="uvicorn workers for the API")
+    p.add_argument("--startup-timeout", type=float, default=120.0)
+
+    p.add_argument("--llm-ttft", type=float, default=0.2, help="Fake Ollama seconds to first token")
+    p.add_argument("--llm-tps", type=float, default=50.0, help="Fake Ollama tokens per second")
+    p.add_argument("--llm-tokens", type=int, default=80, help="Fake Ollama completion length")
+    p.add_argument("--llm-jitter", type=float, default=0.0)
+    p.add_argument("--search-latency", type=float, default=0.3)
+    p.add_argument("--search-jitter", type=float, default=0.0)
+    p.add_argument("--search-error-rate", type=float, default=0.0)
+
+    p.add_argument("--json", dest="json_out", help="Also write the report to this JSON file")
+    return p.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    ollama = search = proc = None
+    base_url = args.target
+    with tempfile.TemporaryDirectory(prefix="lira-loadtest-") as workdir:
+        try:
+            if not base_url:
+                ollama = FakeOllama(
+                    ttft=args.llm_ttft, tokens_per_sec=args.llm_tps,
+                    tokens=args.llm_tokens, jitter=args.llm_jitter,
+                ).start()
+                search = FakeSearch(
+                    latency=args.search_latency, jitter=args.search_jitter,
+                    error_rate=args.search_error_rate,
+                ).start()
+                print(f"Fake Ollama at {ollama.url}, fake search at {search.search_url}")
+                proc, base_url = start_service(args, ollama, search, workdir)
+                print(f"API at {base_url}")
+
+            stats, elapsed = asyncio.run(drive(args, base_url))
+        finally:
+            if proc:
+                proc.terminate()
+                proc.wait(timeout=10)
+            for server in (ollama, search):
+                if server:
+                    server.stop()
+
+    reports = [s.report(elapsed) for s in stats]
+    print_report(reports, elapsed)
+    if args.json_out:
+        with open(args.json_out, "w", encoding="utf-8") as f:
+            json.dump({"elapsed_s": round(elapsed, 2), "endpoints": reports}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -18,7 +18,7 @@ import chromadb
 from chromadb.config import Settings
 
 # Embeddings
-from sentence_transformers import SentenceTransformer
+from app.agent.embeddings import get_embedder
 
 # LangChain imports
 from langchain_ollama import ChatOllama
@@ -34,8 +34,9 @@ def get_embeddings_model():
     """
     Use a free lightweight embedding model.
     Good for experimentation and RAG.
+    Backend (torch / onnx) is selected by LIRA_EMBEDDING_BACKEND.
     """
-    return SentenceTransformer("all-MiniLM-L6-v2")
+    return get_embedder()
 
 # ---------------------------------------------------
 # LLM (Ollama)